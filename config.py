@@ -8,12 +8,13 @@ from pathlib import Path
 
 # Paths
 WORKSPACE_ROOT = Path(__file__).parent
-AGENTS_DIR = WORKSPACE_ROOT / "agents"
+# Point SMOL_AGENTS_DIR at a tmpfs (e.g. /dev/shm/agents) to keep agent I/O off slow disks
+AGENTS_DIR = Path(os.getenv("SMOL_AGENTS_DIR", str(WORKSPACE_ROOT / "agents")))
 REFERENCE_DIR = WORKSPACE_ROOT / "_reference"
 PROMPT_FILE = WORKSPACE_ROOT / "prompt.md"
 
 # ── Provider configuration ──────────────────────────────────────────
-# Supported providers: "github", "huggingface", "openai", "local"
+# Supported providers: "github", "huggingface", "openai", "local", "vllm"
 PROVIDER = os.getenv("SMOL_PROVIDER", "huggingface").strip().lower()
 
 # Model ID — meaning depends on provider (see .env.example)
@@ -41,6 +42,11 @@ PROVIDER_DEFAULTS: dict[str, dict[str, str]] = {
         "token_env": "",
         "default_model": "microsoft/phi-3-mini-4k-instruct",
     },
+    "vllm": {
+        "api_base": "",  # no SMOL_API_BASE: the launcher starts a server on SMOL_VLLM_PORT
+        "token_env": "",
+        "default_model": "Qwen/Qwen2.5-Coder-7B-Instruct",
+    },
 }
 
 # Resolved values
@@ -51,6 +57,34 @@ if not MODEL_ID or MODEL_ID == "Qwen/Qwen2.5-Coder-32B-Instruct":
     # Only override with provider default when the user hasn't explicitly set one
     MODEL_ID = os.getenv("SMOL_MODEL_ID", _defaults["default_model"])
 
+# Sent as OpenAI's prompt_cache_key so every step's identical system prompt + reference
+# prefix is routed to the same prompt cache (api.openai.com only); "" disables
+PROMPT_CACHE_KEY = os.getenv("SMOL_PROMPT_CACHE_KEY", "recursive-coder")
+
 # Agent behaviour
 MAX_STEPS = int(os.getenv("SMOL_MAX_STEPS", "30"))
+# 0=silent, 1=summary, 2=full (clamped); unset means 2 on a terminal and 0 when redirected
+_verbosity = os.getenv("SMOL_VERBOSITY", "").strip()
+VERBOSITY: int | None = None
+if _verbosity:
+    try:
+        VERBOSITY = min(max(int(_verbosity), 0), 2)
+    except ValueError:
+        print(f"Ignoring SMOL_VERBOSITY={_verbosity!r}: expected 0, 1 or 2")
+# Local-model quantization scheme: none | int8 | nf4 | fp4
+# SMOL_QUANTIZE is the legacy on/off switch, honoured only when SMOL_QUANT is unset
 QUANTIZE = os.getenv("SMOL_QUANTIZE", "true").lower() in {"1", "true", "yes"}
+QUANT = os.getenv("SMOL_QUANT", "nf4" if QUANTIZE else "none").strip().lower()
+# Pre-quantized weights are saved here after the first load; set to "" to disable
+QUANT_CACHE_DIR = os.getenv(
+    "SMOL_QUANT_CACHE_DIR", str(Path.home() / ".cache" / "recursive-coder" / "quantized")
+)
+# Weight precision: bf16 | fp16 | fp32; "" means bf16 locally and vLLM's own "auto" choice
+DTYPE = os.getenv("SMOL_DTYPE", "").strip().lower()
+# Attention kernel for the local model: flash_attention_2 | sdpa | eager ("" picks the best)
+ATTN_IMPLEMENTATION = os.getenv("SMOL_ATTN", "").strip().lower()
+# torch.compile + static KV cache for the local model (slow first call, faster decode)
+COMPILE = os.getenv("SMOL_COMPILE", "false").lower() in {"1", "true", "yes"}
+# Static KV cache length in tokens for SMOL_COMPILE (0 = the model's context length)
+MAX_CACHE_LEN = int(os.getenv("SMOL_MAX_CACHE_LEN", "0"))
+VLLM_PORT = int(os.getenv("SMOL_VLLM_PORT", "8000"))
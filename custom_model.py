@@ -1,23 +1,74 @@
-"""Custom model class for direct Hugging Face model support."""
+"""Custom model class for direct Hugging Face model support.
 
+torch and transformers are imported inside the methods that need them, so
+importing this module stays cheap until a model is actually constructed.
+"""
+
+import atexit
+import importlib.util
 import os
-import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer, BitsAndBytesConfig
+import shutil
+import subprocess
+import sys
+import time
+import urllib.request
+from collections.abc import MutableMapping
+from pathlib import Path
+from typing import TYPE_CHECKING
+
 from smolagents.models import Model
-from smolagents.models import ChatMessage
+from smolagents.models import (
+    ChatMessage,
+    MessageRole,
+    get_clean_message_list,
+    tool_role_conversions,
+)
+
+if TYPE_CHECKING:
+    import torch
+    from transformers import DynamicCache
+
+# SMOL_DTYPE values -> torch dtype attribute names
+_DTYPES = {"bf16": "bfloat16", "fp16": "float16", "fp32": "float32"}
+
+# SMOL_QUANT values (bitsandbytes, CUDA only)
+_QUANT_SCHEMES = ("none", "int8", "nf4", "fp4")
 
 
 class DirectTransformersModel(Model):
     """Direct Transformers model without SmolAgents auto-detection."""
     
-    def __init__(self, model_id: str = "microsoft/phi-3-mini-4k-instruct", device: str = None, quantize: bool = True):
+    def __init__(
+        self,
+        model_id: str = "microsoft/phi-3-mini-4k-instruct",
+        device: str = None,
+        quant: str = "nf4",
+        dtype: str = "bf16",
+        quant_cache_dir: str | None = None,
+        compile_model: bool = False,
+        max_cache_len: int = 0,
+        attn_implementation: str = "",
+    ):
         """Initialize model and tokenizer.
         
         Args:
             model_id: Hugging Face model ID
             device: Device to load model on ("cuda", "cpu", "mps")
-            quantize: Use 8-bit quantization for reduced memory (CUDA only)
+            quant: bitsandbytes scheme: "none", "int8", "nf4" or "fp4" (CUDA only)
+            dtype: Weight/compute precision: "bf16", "fp16" or "fp32"
+            quant_cache_dir: Directory for pre-quantized weights; None disables the cache
+            compile_model: torch.compile decode steps with a static KV cache (CUDA, unquantized)
+            max_cache_len: Static KV cache length in tokens; 0 uses the model's context length
+            attn_implementation: "flash_attention_2", "sdpa" or "eager"; empty picks the best
         """
+        if quant not in _QUANT_SCHEMES:
+            raise ValueError(f"quant must be one of {_QUANT_SCHEMES}, got {quant!r}")
+        if dtype not in _DTYPES:
+            raise ValueError(f"dtype must be one of {sorted(_DTYPES)}, got {dtype!r}")
+
+        import torch
+        from transformers import AutoModelForCausalLM, AutoTokenizer, BitsAndBytesConfig
+
         self.model_id = model_id
         
         if device is None:
@@ -25,59 +76,256 @@ class DirectTransformersModel(Model):
         else:
             self.device = device
         
+        # 16-bit weights move half the bytes of fp32; fall back where they have no fast kernels
+        dtype = self._fast_dtype(dtype)
+        torch_dtype = getattr(torch, _DTYPES[dtype])
+        if self.device != "cuda":
+            quant = "none"
+        
         print(f"Loading {model_id}...")
-        print(f"Device: {self.device}, Quantize: {quantize and self.device == 'cuda'}")
+        print(f"Device: {self.device}, Quant: {quant}, dtype: {dtype}")
         
         self.tokenizer = AutoTokenizer.from_pretrained(model_id, trust_remote_code=True)
         if self.tokenizer.pad_token is None:
             self.tokenizer.pad_token = self.tokenizer.eos_token
         
-        # Use 8-bit quantization to reduce memory footprint (CUDA only)
+        # Use bitsandbytes quantization to reduce memory footprint (CUDA only)
         kwargs = {
             "trust_remote_code": True,
         }
         
-        if quantize and self.device == "cuda":
-            # Use device_map="auto" to split between GPU and CPU with float16
-            # This automatically distributes layers to fit in available memory
+        if quant != "none":
+            # Decode is memory-bandwidth bound, so fewer weight bytes means more tokens/s.
+            # 4-bit halves the weight traffic of 8-bit; compute runs in the chosen dtype.
+            # Without fp32 CPU offload, bitsandbytes refuses to load a model that device_map
+            # has to spill to CPU; with it, layers that do not fit stay unquantized on CPU
+            if quant == "int8":
+                kwargs["quantization_config"] = BitsAndBytesConfig(
+                    load_in_8bit=True,
+                    llm_int8_enable_fp32_cpu_offload=True,
+                )
+            else:
+                kwargs["quantization_config"] = BitsAndBytesConfig(
+                    load_in_4bit=True,
+                    bnb_4bit_quant_type=quant,
+                    bnb_4bit_compute_dtype=torch_dtype,
+                    bnb_4bit_use_double_quant=True,
+                    llm_int8_enable_fp32_cpu_offload=True,
+                )
+            # device_map="auto" splits layers between GPU and CPU if the model does not fit
             kwargs["device_map"] = "auto"
-            kwargs["torch_dtype"] = torch.float16
-            print("Using device_map=auto with float16 (GPU+CPU split)")
+            kwargs["torch_dtype"] = torch_dtype
+            print(f"Using {quant} bitsandbytes quantization with device_map=auto")
         else:
-            # For CPU, use float32 (no quantization)
-            kwargs["torch_dtype"] = torch.float32
-            if self.device == "cpu":
-                print("Using float32 on CPU (slower but works)")
-        
-        # Use eager attention to avoid cache compatibility issues
-        self.model = AutoModelForCausalLM.from_pretrained(
-            model_id, 
-            attn_implementation="eager",  # Avoid cache issues with device_map
-            **kwargs
-        )
+            kwargs["torch_dtype"] = torch_dtype
+            if self.device != "cpu":
+                # Place the whole model on the accelerator instead of leaving it on CPU
+                kwargs["device_map"] = self.device
+            if dtype == "fp32":
+                print("Using float32 (slower but works everywhere)")
+        
+        # Quantizing a large checkpoint takes minutes; reuse weights saved by a previous run
+        load_from = model_id
+        cache_path = None
+        if quant != "none" and quant_cache_dir:
+            cache_name = f"{model_id.replace('/', '--')}__{quant}__{dtype}"
+            cache_path = Path(quant_cache_dir).expanduser() / cache_name
+            if (cache_path / "config.json").exists():
+                load_from = str(cache_path)
+                # The saved config already carries the quantization settings
+                kwargs.pop("quantization_config")
+                print(f"Loading pre-quantized weights from {cache_path}")
+        
+        auto_attention = not attn_implementation
+        attn_implementation = attn_implementation or self._best_attention(dtype)
+        if attn_implementation:
+            kwargs["attn_implementation"] = attn_implementation
+        # Unset, transformers picks SDPA where the architecture supports it and eager
+        # otherwise; forcing "sdpa" fails to load models (often remote code) without it
+        print(f"Attention: {attn_implementation or 'transformers default'}")
+        try:
+            self.model = AutoModelForCausalLM.from_pretrained(load_from, **kwargs)
+        except ValueError as exc:
+            # Not every architecture implements FlashAttention-2; an explicit SMOL_ATTN
+            # still fails loudly, only the automatic pick falls back
+            if not (auto_attention and attn_implementation):
+                raise
+            print(f"{attn_implementation} not supported ({exc}); using transformers default")
+            del kwargs["attn_implementation"]
+            self.model = AutoModelForCausalLM.from_pretrained(load_from, **kwargs)
         print(f"Model loaded successfully on {self.device}")
+
+        if cache_path is not None and load_from == model_id:
+            self._save_quantized(cache_path)
+
+        # The default DynamicCache breaks when device_map="auto" splits layers across
+        # devices; a StaticCache is allocated per layer device and avoids that, so the
+        # cache can stay on instead of recomputing attention over the prefix every token.
+        devices = set(getattr(self.model, "hf_device_map", {}).values())
+        self._cache_kwargs = {"use_cache": True}
+        if len(devices) > 1:
+            self._cache_kwargs["cache_implementation"] = "static"
+            print(f"Model split across {len(devices)} devices, using static KV cache")
+
+        # Preallocated once with a fixed length, so every decode step sees the same shapes
+        # whatever the prompt length, and compiled CUDA graphs replay instead of recompiling
+        self._static_cache = None
+        if compile_model and self.device == "cuda" and quant == "none" and len(devices) <= 1:
+            from transformers import CompileConfig, StaticCache
+
+            self._max_cache_len = max_cache_len or self.model.config.max_position_embeddings
+            self._static_cache = StaticCache(
+                config=self.model.config,
+                max_batch_size=1,
+                max_cache_len=self._max_cache_len,
+                device=self.model.device,
+                dtype=torch_dtype,
+            )
+            # generate() compiles only the decode forward when handed a static cache;
+            # prefill runs eagerly, so a new prompt length does not trigger a recompile
+            self.model.generation_config.compile_config = CompileConfig(
+                fullgraph=True, mode="reduce-overhead"
+            )
+            print(f"Compiling decode steps with a {self._max_cache_len}-token static KV cache")
+        elif compile_model:
+            print("torch.compile needs an unquantized model on a single CUDA device; skipping")
+
+        # (token ids, DynamicCache) from the last generate() call. Every agent step resends
+        # the same system prompt, task and history, so the next call re-prefills only the
+        # tokens past the shared prefix. Static caches are preallocated and not reused.
+        self._prefix_cache = None
+        self._reuse_cache = (
+            "cache_implementation" not in self._cache_kwargs and self._static_cache is None
+        )
+        # (system content, rendered system turn, token ids) for _tokenize_messages
+        self._system_prefix_ids = None
+
+        if self.device == "cuda":
+            self._warmup()
+
+    def _fast_dtype(self, dtype: str) -> str:
+        """Downgrade the requested precision to one this device runs natively.
+        
+        bf16 needs an Ampere+ GPU, macOS 14+ on MPS, or AVX512-BF16/AMX on CPU; elsewhere
+        it is emulated and slower than the fallback. CPUs have no fast fp16 matmuls at all.
+        
+        Args:
+            dtype: Requested precision name ("bf16", "fp16" or "fp32")
+        
+        Returns:
+            Precision name to load the weights in
+        """
+        import torch
+
+        if dtype == "bf16":
+            if self.device == "cuda":
+                if not torch.cuda.is_bf16_supported():
+                    return "fp16"
+            elif self.device == "mps":
+                is_macos_or_newer = getattr(torch.backends.mps, "is_macos_or_newer", None)
+                if is_macos_or_newer is None or not is_macos_or_newer(14, 0):
+                    return "fp16"
+            elif self.device == "cpu":
+                checks = ("_is_avx512_bf16_supported", "_is_amx_tile_supported")
+                if not any(getattr(torch.cpu, name, lambda: False)() for name in checks):
+                    return "fp32"
+        if dtype == "fp16" and self.device == "cpu":
+            return "fp32"
+        return dtype
+
+    def _best_attention(self, dtype: str) -> str | None:
+        """Pick the fastest attention kernel available for this device and dtype.
+        
+        FlashAttention-2 tiles softmax(QK)V so the attention matrix never hits HBM;
+        it needs the flash_attn package, an Ampere+ GPU and 16-bit activations.
+        Everywhere else the choice is left to transformers, which uses SDPA
+        (PyTorch's fused kernel) when the architecture supports it and eager otherwise.
+        
+        Args:
+            dtype: Resolved precision name ("bf16", "fp16" or "fp32")
+        
+        Returns:
+            Value for from_pretrained(attn_implementation=...); None leaves it unset
+        """
+        import torch
+
+        if (
+            self.device == "cuda"
+            and dtype != "fp32"
+            and importlib.util.find_spec("flash_attn") is not None
+            and torch.cuda.get_device_capability()[0] >= 8
+        ):
+            return "flash_attention_2"
+        return None
+
+    def _save_quantized(self, cache_path: Path) -> None:
+        """Save the freshly quantized weights so later launches can skip quantization.
+        
+        Skipped when layers are offloaded to CPU or disk, which bitsandbytes cannot
+        serialize. A failed save leaves a ``<cache>.unsupported`` marker so later
+        launches do not repeat a multi-GB write that fails the same way.
+        
+        Args:
+            cache_path: Final cache directory; written via a temp dir and renamed
+        """
+        marker = cache_path.with_name(cache_path.name + ".unsupported")
+        if marker.exists():
+            print(f"Earlier quantized-weight save failed; delete {marker} to retry")
+            return
+        offloaded = {"cpu", "disk"} & set(getattr(self.model, "hf_device_map", {}).values())
+        if offloaded:
+            # Depends on free VRAM, so no marker: a later launch may fit entirely on the GPU
+            print("Not caching quantized weights: some layers are offloaded to CPU/disk")
+            return
+        
+        tmp_path = cache_path.with_name(cache_path.name + ".tmp")
+        # A run killed mid-save leaves a partial multi-GB temp dir; never write into it
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        try:
+            self.model.save_pretrained(tmp_path, safe_serialization=True)
+            tmp_path.rename(cache_path)
+        except Exception as exc:
+            # e.g. older bitsandbytes cannot serialize 4-bit weights; not fatal
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            marker.write_text(f"{exc}\n", encoding="utf-8")
+            print(f"Could not cache quantized weights: {exc}")
+            return
+        print(f"Cached quantized weights at {cache_path}")
+
+    def _warmup(self) -> None:
+        """Run one tiny generation so the first real call skips CUDA kernel setup."""
+        import torch
+
+        device = next(self.model.parameters()).device
+        inputs = self.tokenizer("hi", return_tensors="pt").to(device)
+        # With a static cache the decode shapes do not depend on the prompt, so this also
+        # compiles and records the CUDA graphs every real call replays
+        generation_kwargs = {"max_new_tokens": 8, "do_sample": False, **self._cache_kwargs}
+        generation_kwargs.update(self._static_cache_kwargs(inputs["input_ids"].shape[1], 8))
+        with torch.inference_mode():
+            self.model.generate(**inputs, **generation_kwargs)
+        print("[Model] Warmup complete.", flush=True)
     
-    def generate(self, messages: list[ChatMessage], **kwargs) -> str:
+    def generate(
+        self,
+        messages: list[ChatMessage],
+        stop_sequences: list[str] | None = None,
+        **kwargs,
+    ) -> ChatMessage:
         """Generate text from messages (required by smolagents).
         
         Args:
             messages: List of ChatMessage objects
+            stop_sequences: Stop generating at, and cut the output before, any of these strings
             **kwargs: Additional generation args
         
         Returns:
-            Generated text
+            Assistant ChatMessage with the generated text
         """
-        # Convert messages to prompt text
-        prompt_text = ""
-        for msg in messages:
-            if msg.role == "user":
-                prompt_text += f"User: {msg.content}\n"
-            elif msg.role == "assistant":
-                prompt_text += f"Assistant: {msg.content}\n"
-            elif msg.role == "system":
-                prompt_text += f"System: {msg.content}\n"
-        
-        prompt_text += "Assistant:"
+        import torch
+
+        inputs = self._tokenize_messages(messages)
         
         # Set defaults for generation
         generation_kwargs = {
@@ -85,23 +333,167 @@ class DirectTransformersModel(Model):
             "temperature": kwargs.get("temperature", 0.7),
             "top_p": kwargs.get("top_p", 0.9),
             "do_sample": kwargs.get("do_sample", True),
-            "use_cache": False,  # Disable cache to avoid DynamicCache issues with device_map
+            **self._cache_kwargs,
         }
         
-        inputs = self.tokenizer(prompt_text, return_tensors="pt")
         # Move inputs to the correct device (model may be split across devices)
         for key in inputs:
             if isinstance(inputs[key], torch.Tensor):
                 inputs[key] = inputs[key].to(next(self.model.parameters()).device)
         
+        if stop_sequences:
+            # Stop as soon as e.g. "Observation:" appears instead of running to max_new_tokens
+            generation_kwargs["stop_strings"] = stop_sequences
+            generation_kwargs["tokenizer"] = self.tokenizer
+        if self._reuse_cache:
+            generation_kwargs["past_key_values"] = self._reusable_cache(inputs["input_ids"])
+        generation_kwargs.update(
+            self._static_cache_kwargs(
+                inputs["input_ids"].shape[1], generation_kwargs["max_new_tokens"]
+            )
+        )
+        
         print(f"[Model] Generating response ({generation_kwargs['max_new_tokens']} max tokens)...", flush=True)
-        with torch.no_grad():
+        with torch.inference_mode():
             outputs = self.model.generate(**inputs, **generation_kwargs)
         print(f"[Model] Generation complete.", flush=True)
         
-        result = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-        # Remove the prompt from the output
-        return result[len(prompt_text):].strip()
+        if self._reuse_cache:
+            # generate() filled the cache in place; it covers all but the last sampled token
+            cache = generation_kwargs["past_key_values"]
+            self._prefix_cache = (outputs[0, : cache.get_seq_length()], cache)
+        
+        # The chat template's rendered text differs from the decoded prompt, so decode
+        # only the newly generated tokens instead of slicing the string
+        new_tokens = outputs[0, inputs["input_ids"].shape[1]:]
+        text = self.tokenizer.decode(new_tokens, skip_special_tokens=True)
+        # Generation stops on the token that completes a stop string; drop it and what follows
+        for stop in stop_sequences or []:
+            text = text.split(stop)[0]
+        return ChatMessage(role=MessageRole.ASSISTANT, content=text.strip())
+    
+    def _static_cache_kwargs(self, prompt_len: int, max_new_tokens: int) -> dict:
+        """Return generate() kwargs that reuse the preallocated static cache, emptied.
+        
+        Args:
+            prompt_len: Prompt length in tokens
+            max_new_tokens: Requested completion length
+        
+        Returns:
+            past_key_values/max_new_tokens kwargs; empty when no static cache is in use
+        """
+        import torch
+
+        if self._static_cache is None:
+            return {}
+        room = self._max_cache_len - prompt_len
+        if room <= 0:
+            raise ValueError(
+                f"Prompt of {prompt_len} tokens does not fit the "
+                f"{self._max_cache_len}-token static cache; raise SMOL_MAX_CACHE_LEN"
+            )
+        # The buffers were allocated under inference_mode, so they can only be zeroed there
+        with torch.inference_mode():
+            self._static_cache.reset()
+        return {"past_key_values": self._static_cache, "max_new_tokens": min(max_new_tokens, room)}
+    
+    def _reusable_cache(self, input_ids: "torch.Tensor") -> "DynamicCache":
+        """Return the previous call's KV cache cropped to the prefix shared with input_ids.
+        
+        Args:
+            input_ids: Prompt token ids of shape (1, seq_len)
+        
+        Returns:
+            A DynamicCache to pass to generate(); empty when nothing can be reused
+        """
+        from transformers import DynamicCache
+
+        previous, self._prefix_cache = self._prefix_cache, None
+        if previous is None:
+            return DynamicCache()
+        cached_ids, cache = previous
+        
+        # Keep at least one prompt token uncached so generate() has something to prefill
+        limit = min(cached_ids.shape[0], input_ids.shape[1] - 1)
+        matches = cached_ids[:limit] == input_ids[0, :limit]
+        shared = limit if bool(matches.all()) else int(matches.int().argmin())
+        if shared == 0:
+            return DynamicCache()
+        excess = cache.get_seq_length() - shared
+        if excess > 0:
+            # A negative length drops that many trailing tokens
+            cache.crop(-excess)
+        return cache
+    
+    def _tokenize_messages(
+        self, messages: list[ChatMessage]
+    ) -> "MutableMapping[str, torch.Tensor]":
+        """Tokenize chat messages with the model's own chat template.
+        
+        Falls back to a plain "User:/Assistant:" transcript for tokenizers
+        that ship without a chat template.
+        
+        Args:
+            messages: List of ChatMessage objects
+        
+        Returns:
+            Mapping with input_ids and attention_mask tensors
+        """
+        import torch
+
+        # Same conversion as smolagents' own models: tool calls become assistant turns,
+        # code observations/errors become user turns, and consecutive same-role turns merge.
+        # Roles come back as MessageRole; templates need the plain "user"/"assistant" strings.
+        chat = [
+            {"role": MessageRole(turn["role"]).value, "content": turn["content"]}
+            for turn in get_clean_message_list(
+                messages, role_conversions=tool_role_conversions, flatten_messages_as_text=True
+            )
+        ]
+        
+        if self.tokenizer.chat_template:
+            text = self.tokenizer.apply_chat_template(
+                chat, add_generation_prompt=True, tokenize=False
+            )
+            # The system message (prompt.md + reference docs) is identical on every step;
+            # reuse its token ids and only tokenize what follows it
+            prefix_text, prefix_ids = self._system_prefix(chat)
+            if prefix_ids is not None and text.startswith(prefix_text):
+                suffix_ids = self.tokenizer(
+                    text[len(prefix_text):], add_special_tokens=False, return_tensors="pt"
+                )["input_ids"]
+                input_ids = torch.cat([prefix_ids, suffix_ids], dim=1)
+                return {"input_ids": input_ids, "attention_mask": torch.ones_like(input_ids)}
+            return self.tokenizer(text, add_special_tokens=False, return_tensors="pt")
+        
+        prompt_text = ""
+        for turn in chat:
+            prompt_text += f"{turn['role'].capitalize()}: {turn['content']}\n"
+        prompt_text += "Assistant:"
+        return self.tokenizer(prompt_text, return_tensors="pt")
+    
+    def _system_prefix(self, chat: list[dict]) -> "tuple[str, torch.Tensor | None]":
+        """Return the rendered system turn and its token ids, tokenizing it only once.
+        
+        Args:
+            chat: Role/content dicts as passed to apply_chat_template
+        
+        Returns:
+            (prefix_text, prefix_ids) tuple; prefix_ids is None when there is no
+            system turn or the template cannot render one on its own
+        """
+        if not chat or chat[0]["role"] != "system":
+            return "", None
+        content = chat[0]["content"]
+        if self._system_prefix_ids is None or self._system_prefix_ids[0] != content:
+            try:
+                text = self.tokenizer.apply_chat_template(chat[:1], tokenize=False)
+                ids = self.tokenizer(text, add_special_tokens=False, return_tensors="pt")
+                self._system_prefix_ids = (content, text, ids["input_ids"])
+            except Exception:
+                # Some templates reject a system-only conversation; tokenize in full instead
+                self._system_prefix_ids = (content, "", None)
+        return self._system_prefix_ids[1], self._system_prefix_ids[2]
     
     def __call__(self, prompt: str, stop_sequences: list[str] | None = None, **kwargs) -> str:
         """Generate text from prompt (for backward compatibility).
@@ -114,18 +506,87 @@ class DirectTransformersModel(Model):
         Returns:
             Generated text
         """
+        import torch
+
         # Set defaults for generation
         generation_kwargs = {
             "max_new_tokens": kwargs.get("max_new_tokens", 2048),
             "temperature": kwargs.get("temperature", 0.7),
             "top_p": kwargs.get("top_p", 0.9),
             "do_sample": kwargs.get("do_sample", True),
+            **self._cache_kwargs,
         }
         
         inputs = self.tokenizer(prompt, return_tensors="pt").to(self.model.device)
-        with torch.no_grad():
+        with torch.inference_mode():
             outputs = self.model.generate(**inputs, **generation_kwargs)
         
-        result = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-        # Remove the prompt from the output
-        return result[len(prompt):].strip()
+        # Decode only the completion instead of re-decoding the prompt and slicing it off
+        new_tokens = outputs[0, inputs["input_ids"].shape[1]:]
+        return self.tokenizer.decode(new_tokens, skip_special_tokens=True).strip()
+
+
+class VLLMLocalServer:
+    """Local vLLM OpenAI-compatible server, run as a subprocess.
+    
+    vLLM's PagedAttention and continuous batching suit the many short,
+    concurrent prompts of recursive agents far better than plain
+    transformers generation. Point OpenAIServerModel at ``api_base``.
+    """
+    
+    def __init__(
+        self,
+        model_id: str,
+        port: int = 8000,
+        dtype: str = "auto",
+        startup_timeout: float = 600.0,
+    ):
+        """Start the server and block until it answers.
+        
+        Args:
+            model_id: Hugging Face model ID to serve
+            port: Local port for the OpenAI-compatible API
+            dtype: Weight precision: "auto" (vLLM picks per GPU), "bf16", "fp16" or "fp32"
+            startup_timeout: Seconds to wait for the model to load
+        """
+        if dtype != "auto" and dtype not in _DTYPES:
+            raise ValueError(f"dtype must be 'auto' or one of {sorted(_DTYPES)}, got {dtype!r}")
+        
+        self.api_base = f"http://127.0.0.1:{port}/v1"
+        cmd = [
+            sys.executable, "-m", "vllm.entrypoints.openai.api_server",
+            "--model", model_id,
+            "--port", str(port),
+            "--dtype", _DTYPES.get(dtype, dtype),
+            "--enable-prefix-caching",
+            "--max-num-batched-tokens", "8192",
+        ]
+        print(f"Starting vLLM server for {model_id} on port {port}...")
+        self.process = subprocess.Popen(cmd)
+        atexit.register(self.stop)
+        self._wait_until_ready(startup_timeout)
+        print(f"vLLM server ready at {self.api_base}")
+    
+    def _wait_until_ready(self, timeout: float) -> None:
+        """Poll /v1/models until the server responds, exits, or times out."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"vLLM server exited with code {self.process.returncode}")
+            try:
+                with urllib.request.urlopen(f"{self.api_base}/models", timeout=5):
+                    return
+            except OSError:
+                time.sleep(2)
+        self.stop()
+        raise TimeoutError(f"vLLM server not ready after {timeout:.0f}s")
+    
+    def stop(self) -> None:
+        """Terminate the server process if it is still running."""
+        if self.process.poll() is not None:
+            return
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
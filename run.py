@@ -6,7 +6,10 @@ The agent self-scaffolds everything else.
 
 import os
 import sys
+import threading
+from collections.abc import Callable
 from pathlib import Path
+from typing import TYPE_CHECKING, Any
 
 # Fix Windows console encoding for Rich/smolagents Unicode output
 if sys.platform == "win32":
@@ -16,8 +19,18 @@ if sys.platform == "win32":
 
 from dotenv import load_dotenv
 
+if TYPE_CHECKING:
+    from smolagents import Tool
+
 load_dotenv()
 
+# Modules the agent's generated code may import, on top of smolagents' safe builtins
+AUTHORIZED_IMPORTS: tuple[str, ...] = (
+    "subprocess", "pathlib", "json", "importlib",
+    "inspect", "datetime", "re", "os", "sys",
+    "requests", "urllib", "http", "io",
+)
+
 
 def _load_model():
     """Load the model based on SMOL_PROVIDER setting.
@@ -27,17 +40,41 @@ def _load_model():
         huggingface – HF Inference API (needs HF_TOKEN)
         openai      – OpenAI API (needs OPENAI_API_KEY)
         local       – Local HuggingFace model on GPU/CPU
+        vllm        – Local vLLM server (PagedAttention, continuous batching)
 
     Returns:
         (model, model_id) tuple for CodeAgent.
     """
-    from config import PROVIDER, MODEL_ID, API_BASE, API_TOKEN, QUANTIZE
+    from config import (
+        PROVIDER,
+        MODEL_ID,
+        API_BASE,
+        API_TOKEN,
+        QUANT,
+        DTYPE,
+        QUANT_CACHE_DIR,
+        PROMPT_CACHE_KEY,
+        VLLM_PORT,
+        COMPILE,
+        MAX_CACHE_LEN,
+        ATTN_IMPLEMENTATION,
+    )
 
     if PROVIDER == "local":
         from custom_model import DirectTransformersModel
 
-        print(f"Loading local model: {MODEL_ID} (quantize={QUANTIZE})")
-        return DirectTransformersModel(model_id=MODEL_ID, quantize=QUANTIZE), MODEL_ID
+        dtype = DTYPE or "bf16"
+        print(f"Loading local model: {MODEL_ID} (quant={QUANT}, dtype={dtype})")
+        model = DirectTransformersModel(
+            model_id=MODEL_ID,
+            quant=QUANT,
+            dtype=dtype,
+            quant_cache_dir=QUANT_CACHE_DIR or None,
+            compile_model=COMPILE,
+            max_cache_len=MAX_CACHE_LEN,
+            attn_implementation=ATTN_IMPLEMENTATION,
+        )
+        return model, MODEL_ID
 
     if PROVIDER == "huggingface":
         from smolagents import InferenceClientModel
@@ -50,6 +87,24 @@ def _load_model():
         print(f"Using HF Inference API: {MODEL_ID}")
         return InferenceClientModel(model_id=MODEL_ID, token=API_TOKEN), MODEL_ID
 
+    if PROVIDER == "vllm":
+        from smolagents import OpenAIServerModel
+
+        from custom_model import VLLMLocalServer
+
+        # SMOL_API_BASE points at an already running vLLM server; otherwise start one
+        base = API_BASE
+        if not base:
+            # "auto" lets vLLM pick bf16 or fp16 for the GPU; bf16 fails on pre-Ampere cards
+            server = VLLMLocalServer(model_id=MODEL_ID, port=VLLM_PORT, dtype=DTYPE or "auto")
+            base = server.api_base
+        print(f"Using vllm endpoint: {base}")
+        print(f"Model: {MODEL_ID}")
+        return (
+            OpenAIServerModel(model_id=MODEL_ID, api_base=base, api_key="EMPTY"),
+            MODEL_ID,
+        )
+
     # github / openai / any OpenAI-compatible endpoint
     if PROVIDER in {"github", "openai"}:
         from smolagents import OpenAIServerModel
@@ -64,29 +119,103 @@ def _load_model():
             if PROVIDER == "github"
             else "https://api.openai.com/v1"
         )
+        # prompt_cache_key is an OpenAI API field; other compatible endpoints may reject it
+        extra = {}
+        if PROMPT_CACHE_KEY and base.startswith("https://api.openai.com"):
+            extra["extra_body"] = {"prompt_cache_key": PROMPT_CACHE_KEY}
+
         print(f"Using {PROVIDER} endpoint: {base}")
         print(f"Model: {MODEL_ID}")
         return (
-            OpenAIServerModel(model_id=MODEL_ID, api_base=base, api_key=API_TOKEN),
+            OpenAIServerModel(model_id=MODEL_ID, api_base=base, api_key=API_TOKEN, **extra),
             MODEL_ID,
         )
 
-    print(f"Unknown provider '{PROVIDER}'. Use one of: github, huggingface, openai, local")
+    print(f"Unknown provider '{PROVIDER}'. Use one of: github, huggingface, openai, local, vllm")
     sys.exit(1)
 
 
+class _BackgroundCall:
+    """Run a zero-argument callable on a daemon thread and hold its outcome.
+
+    Unlike ThreadPoolExecutor workers, a daemon thread is not joined at interpreter exit,
+    so an interrupted launch does not hang until a slow model load finishes.
+    """
+
+    def __init__(self, fn: Callable[[], Any], name: str) -> None:
+        """Start fn immediately.
+
+        Args:
+            fn: Zero-argument callable.
+            name: Thread name, shown in tracebacks and debuggers.
+        """
+        self._done = threading.Event()
+        self._value: Any = None
+        self._error: BaseException | None = None
+        threading.Thread(target=self._run, args=(fn,), name=name, daemon=True).start()
+
+    def _run(self, fn: Callable[[], Any]) -> None:
+        try:
+            self._value = fn()
+        except BaseException as exc:  # includes SystemExit from _load_model
+            self._error = exc
+        finally:
+            self._done.set()
+
+    def result(self) -> Any:
+        """Wait for fn to finish, then return its value or re-raise its exception.
+
+        Waits in short slices: before Python 3.14 an untimed lock wait on Windows cannot
+        be interrupted, so Ctrl+C would otherwise only land once the load finished.
+
+        Returns:
+            fn's return value.
+        """
+        while not self._done.wait(timeout=0.5):
+            pass
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+def _lazy_search_tool() -> "Tool":
+    """Create a DuckDuckGo search tool that defers its client setup until first use.
+
+    DuckDuckGoSearchTool.__init__ imports ddgs (and its HTTP/HTML stack), which costs
+    hundreds of milliseconds even when the agent never searches. smolagents calls
+    Tool.setup() right before a tool's first call, so the real initialisation moves there.
+
+    Returns:
+        Tool instance registered as ``web_search``.
+    """
+    from smolagents import DuckDuckGoSearchTool, Tool
+
+    class LazyDuckDuckGoSearchTool(DuckDuckGoSearchTool):
+        def __init__(self) -> None:
+            Tool.__init__(self)
+
+        def setup(self) -> None:
+            DuckDuckGoSearchTool.__init__(self)
+            self.is_initialized = True
+
+    return LazyDuckDuckGoSearchTool()
+
+
 def main() -> int:
     """Launch the CodeAgent with the system prompt and task."""
 
     try:
-        from smolagents import CodeAgent, DuckDuckGoSearchTool
+        from smolagents import CodeAgent
     except ImportError:
         print("smolagents not installed. Run: pip install -e .[smol]")
         return 1
 
+    from config import AGENTS_DIR, VERBOSITY
+
     # --- Resolve paths ---
     root = Path(__file__).parent
-    agents_dir = root / "agents" / "root"
+    # Absolute, so the agent can be told where it works after the chdir below
+    agents_dir = (AGENTS_DIR / "root").resolve()
     agents_dir.mkdir(parents=True, exist_ok=True)
 
     prompt_file = agents_dir / "prompt.txt"
@@ -94,6 +223,12 @@ def main() -> int:
         print(f"No task found. Create {prompt_file} with your task description.")
         return 1
 
+    # --- Model setup ---
+    # Loading the model is the long pole (seconds to minutes for local weights); start it
+    # now on a worker thread so it overlaps with reading the prompt and reference files.
+    # The thread is a daemon so Ctrl+C exits immediately instead of waiting for the load.
+    model_load = _BackgroundCall(_load_model, name="model-load")
+
     task = prompt_file.read_text(encoding="utf-8").strip()
     system_prompt = (root / "prompt.md").read_text(encoding="utf-8").strip()
 
@@ -101,30 +236,49 @@ def main() -> int:
     reference_dir = root / "_reference"
     reference_context = ""
     if reference_dir.is_dir():
-        for ref_file in sorted(reference_dir.glob("*.md")):
-            reference_context += f"\n\n---\n## Reference: {ref_file.stem}\n\n"
-            reference_context += ref_file.read_text(encoding="utf-8").strip()
+        # One directory scan; DirEntry caches the file type so no extra stat per file
+        with os.scandir(reference_dir) as entries:
+            ref_files = sorted(
+                (e for e in entries if e.name.endswith(".md") and e.is_file()),
+                key=lambda e: e.name,
+            )
+        reference_context = "".join(
+            f"\n\n---\n## Reference: {ref_file.name[:-3]}\n\n"
+            + Path(ref_file.path).read_text(encoding="utf-8").strip()
+            for ref_file in ref_files
+        )
 
-    # --- Model setup ---
     try:
-        model, model_id = _load_model()
+        model, model_id = model_load.result()
+    except KeyboardInterrupt:
+        print("\nInterrupted during model load.")
+        return 130
     except Exception as exc:
         print(f"Model load failed: {exc}")
         return 1
 
     # --- Build and run agent ---
-    full_prompt = f"{system_prompt}{reference_context}\n\n---\n## Your Task\n\n{task}"
+    # The invariant prompt + reference docs go into the system message and only the task
+    # into the user turn, so every step (and every run over the same prompt.md) shares a
+    # byte-identical leading message that server-side prefix caches can reuse.
+    # prompt.md says agents/root/; SMOL_AGENTS_DIR may have moved it, so name the real path
+    workdir_note = (
+        f"\n\nYour working directory is `{agents_dir}` and it is already the current"
+        " directory. Wherever these instructions say `agents/root/`, they mean this directory."
+    )
+    instructions = f"{system_prompt}{workdir_note}{reference_context}"
+    task_prompt = f"## Your Task\n\n{task}"
+
+    # Rendering every step through Rich is wasted work when stdout is a pipe or CI log
+    verbosity = VERBOSITY if VERBOSITY is not None else (2 if sys.stdout.isatty() else 0)
 
     agent = CodeAgent(
-        tools=[DuckDuckGoSearchTool()],
+        tools=[_lazy_search_tool()],
         model=model,
+        instructions=instructions,
         max_steps=int(os.getenv("SMOL_MAX_STEPS", "30")),
-        verbosity_level=2,
-        additional_authorized_imports=[
-            "subprocess", "pathlib", "json", "importlib",
-            "inspect", "datetime", "re", "os", "sys",
-            "requests", "urllib", "http", "io",
-        ],
+        verbosity_level=verbosity,
+        additional_authorized_imports=list(AUTHORIZED_IMPORTS),
     )
 
     print("\n" + "=" * 70)
@@ -135,7 +289,15 @@ def main() -> int:
     print(f"Workdir: {agents_dir}")
     print("=" * 70 + "\n")
 
-    result = agent.run(full_prompt)
+    # The agent's code uses relative paths (prompt.txt, solution.py, task_*/), so run it
+    # from its working directory rather than wherever the launcher was started
+    os.chdir(agents_dir)
+    try:
+        result = agent.run(task_prompt)
+    except KeyboardInterrupt:
+        # Stop on Ctrl+C instead of burning more GPU/API time; report how far the agent got
+        print(f"\nInterrupted during step {agent.step_number}.")
+        return 130
     print(result)
     return 0
 